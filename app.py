@@ -1,3 +1,6 @@
+import functools
+from collections import namedtuple
+
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -21,145 +24,236 @@ if 'params' not in st.session_state:
         'seismic_zone': 0.16 # Zone III
     }
 
+# ==============================================================================
+# MATERIAL CONSTANTS (IS:456 WORKING STRESS)
+# ==============================================================================
+# grade -> (fck N/mm2, sigma_cbc N/mm2)
+MATERIAL_TABLE = {
+    'M20': (20.0, 7.0),
+    'M25': (25.0, 8.5),
+    'M30': (30.0, 10.0),
+    'M35': (35.0, 11.5),
+    'M40': (40.0, 13.0),
+}
+
+MaterialConstants = namedtuple('MaterialConstants',
+                               ['fck', 'sigma_cbc', 'm_ratio', 'E_static_tm2'])
+
+@functools.lru_cache(maxsize=8)
+def material_constants(grade):
+    fck, sigma_cbc = MATERIAL_TABLE[grade]
+    m_ratio = 280 / (3 * sigma_cbc)
+    e_static = 5700 * np.sqrt(fck)          # N/mm2
+    e_static_tm2 = e_static * 1e6 / 9810    # N/mm2 -> t/m2
+    return MaterialConstants(fck, sigma_cbc, m_ratio, e_static_tm2)
+
+# ==============================================================================
+# WORKBOOK CONTAINER (STRUCTURE-OF-ARRAYS)
+# ==============================================================================
+# The sheets only ever touch whole columns (cumsum, elementwise ops, shifts),
+# so the grid lives as one float64 ndarray per column; a pandas DataFrame is
+# built only at display/edit time.
+class Workbook:
+    __slots__ = ('level', 'segment_h', 'outer_dia', 'inner_dia', 'thickness',
+                 'area', 'inertia', 'z_mod', 'shell_wt', 'liner', 'platform',
+                 'corbel')
+
+    # Display column label -> attribute name
+    COLUMNS = {
+        'Level': 'level',
+        'Segment_H': 'segment_h',
+        'Outer_Dia': 'outer_dia',
+        'Inner_Dia': 'inner_dia',
+        'Thickness': 'thickness',
+        'Area': 'area',
+        'Inertia': 'inertia',
+        'Z_Modulus': 'z_mod',
+        'Shell_Wt': 'shell_wt',
+        'Liner_Load': 'liner',
+        'Platform_Load': 'platform',
+        'Corbel_Load': 'corbel',
+    }
+
+    def __len__(self):
+        return len(self.level)
+
+    def to_frame(self):
+        # copy=False: wrap the existing column arrays, no memcpy
+        return pd.DataFrame({label: getattr(self, attr)
+                             for label, attr in self.COLUMNS.items()},
+                            copy=False)
+
+    def tobytes(self):
+        # Stable byte view of all columns, used as the cache key
+        return b''.join(getattr(self, attr).tobytes() for attr in self.__slots__)
+
 # ==============================================================================
 # 1. SHEET 1: DEAD LOADS LOGIC
 # ==============================================================================
+@st.cache_data(max_entries=32)
 def generate_sheet_1(params):
     # Hardcoded levels from your file
     levels = [30.3, 30.0, 27.5, 25.0, 22.5, 20.0, 17.5, 15.0, 12.5, 10.0, 7.5, 5.0, 2.5, 0.0, -1.7, -3.0]
-    
-    data = []
-    
-    for i, lvl in enumerate(levels):
-        inner_dia = params['top_inner_dia'] 
-        outer_dia = inner_dia + (2 * params['thickness'])
-        
-        area = (np.pi / 4) * (outer_dia**2 - inner_dia**2)
-        inertia = (np.pi / 64) * (outer_dia**4 - inner_dia**4)
-        z_mod = inertia / (outer_dia / 2)
-        
-        height_segment = 0.0
-        if i < len(levels) - 1:
-            height_segment = lvl - levels[i+1]
-            
-        if lvl == 30.3: height_segment = 0.0
-        if lvl == 30.0: height_segment = 0.3 
-        
-        shell_wt = area * height_segment * params['conc_density']
-        
-        data.append({
-            'Level': lvl,
-            'Segment_H': height_segment,
-            'Outer_Dia': outer_dia,
-            'Inner_Dia': inner_dia,
-            'Thickness': params['thickness'],
-            'Area': area,
-            'Inertia': inertia,
-            'Z_Modulus': z_mod,
-            'Shell_Wt': shell_wt,
-            'Liner_Load': 0.0,
-            'Platform_Load': 0.0,
-            'Corbel_Load': 0.0
-        })
-        
-    return pd.DataFrame(data)
+
+    # The shell is a constant-diameter cylinder, so the section properties
+    # are the same at every level: compute them once as scalars and
+    # broadcast, instead of repeating the arithmetic per row
+    lvl = np.asarray(levels, dtype=np.float64)
+    inner = params['top_inner_dia']
+    outer = inner + (2 * params['thickness'])
+
+    # Share the squared terms between area and inertia: D^4 - d^4 = (D^2)^2 - (d^2)^2
+    outer_sq = outer * outer
+    inner_sq = inner * inner
+    area = (np.pi / 4) * (outer_sq - inner_sq)
+    inertia = (np.pi / 64) * (outer_sq * outer_sq - inner_sq * inner_sq)
+    z_mod = inertia / (outer / 2)
+
+    # Segment height = drop to the next level down, i.e. the negated diff
+    seg = np.empty_like(lvl)
+    seg[:-1] = -np.diff(lvl)
+    seg[-1] = 0.0
+    # Manual overrides for the cap levels (same rules as the old row loop)
+    seg[lvl == 30.3] = 0.0
+    seg[lvl == 30.0] = 0.3
+
+    shell_wt = area * seg * params['conc_density']
+
+    n = lvl.size
+    wb = Workbook()
+    wb.level = lvl
+    wb.segment_h = seg
+    wb.outer_dia = np.full(n, outer)
+    wb.inner_dia = np.full(n, inner)
+    wb.thickness = np.full(n, params['thickness'])
+    wb.area = np.full(n, area)
+    wb.inertia = np.full(n, inertia)
+    wb.z_mod = np.full(n, z_mod)
+    wb.shell_wt = shell_wt
+    wb.liner = np.zeros_like(lvl)
+    wb.platform = np.zeros_like(lvl)
+    wb.corbel = np.zeros_like(lvl)
+    return wb
 
 # ==============================================================================
 # 2. SHEET 2: WIND LOADS LOGIC
 # ==============================================================================
-def calculate_sheet_2(df, vb, k1=1.0, k3=1.0, cd=0.8):
-    def get_k2(h):
-        if h <= 10: return 1.0
-        if h <= 15: return 1.05
-        if h <= 20: return 1.07
-        if h <= 30: return 1.12
-        return 1.15
-
-    wind_forces = []
-    for i, row in df.iterrows():
-        h_calc = row['Level'] if row['Level'] > 0 else 0
-        k2 = get_k2(h_calc)
-        vz = vb * k1 * k2 * k3
-        pz = 0.6 * (vz**2) / 1000 
-        
-        projected_area = row['Outer_Dia'] * row['Segment_H']
-        force_kn = pz * projected_area * cd
-        force_ton = force_kn / 9.81
-        
-        wind_forces.append(force_ton)
-        
-    df['Wind_Force_Ton'] = wind_forces
-    df['Wind_Shear'] = df['Wind_Force_Ton'].cumsum()
-    
-    moments = [0.0] * len(df)
-    for i in range(1, len(df)):
-        moments[i] = moments[i-1] + (df.at[i-1, 'Wind_Shear'] * df.at[i-1, 'Segment_H'])
-    
-    df['Wind_Moment'] = moments
-    return df
+# K2 (terrain/height factor) lookup table: height break-points and values
+K2_H = np.array([10.0, 15.0, 20.0, 30.0, np.inf])
+K2_V = np.array([1.0, 1.05, 1.07, 1.12, 1.15])
+
+@st.cache_data(max_entries=32, hash_funcs={Workbook: Workbook.tobytes})
+def calculate_sheet_2(wb, vb, k1=1.0, k3=1.0, cd=0.8):
+    # Vectorized over the whole level table - no iterrows
+    h = np.clip(wb.level, 0, None)
+    k2 = K2_V[np.searchsorted(K2_H, h, side='left')]
+
+    vz = vb * k1 * k2 * k3
+    pz = 0.6 * (vz**2) / 1000
+
+    projected_area = wb.outer_dia * wb.segment_h
+    force_kn = pz * projected_area * cd
+    force_ton = force_kn / 9.81
+    shear = np.cumsum(force_ton)
+
+    # Moment at each level = prefix sum of shear x segment height above it
+    moments = np.zeros(len(wb))
+    moments[1:] = np.cumsum(shear[:-1] * wb.segment_h[:-1])
+
+    return {
+        'Wind_Force_Ton': force_ton,
+        'Wind_Shear': shear,
+        'Wind_Moment': moments,
+    }
 
 # ==============================================================================
 # 3. SHEET 3: SEISMIC LOADS LOGIC
 # ==============================================================================
-def calculate_sheet_3(df, zone_factor, I=1.5, R=3.0, Sa_g=2.5):
-    df['Total_Node_Wt'] = df['Shell_Wt'] + df['Liner_Load'] + df['Platform_Load'] + df['Corbel_Load']
-    total_weight = df['Total_Node_Wt'].sum()
-    
+@st.cache_data(max_entries=32, hash_funcs={Workbook: Workbook.tobytes})
+def calculate_sheet_3(wb, zone_factor, I=1.5, R=3.0, Sa_g=2.5):
+    # Accumulate in place: one output array instead of a temporary per add
+    total_node_wt = wb.shell_wt + wb.liner
+    total_node_wt += wb.platform
+    total_node_wt += wb.corbel
+    total_weight = total_node_wt.sum()
+
     Ah = (zone_factor / 2) * (I / R) * Sa_g
     Base_Shear = Ah * total_weight
-    
-    base_level = df['Level'].min()
-    df['Height_h'] = df['Level'] - base_level
-    
-    df['Wi_hi2'] = df['Total_Node_Wt'] * (df['Height_h']**2)
-    sum_Wi_hi2 = df['Wi_hi2'].sum()
-    
+
+    height_h = wb.level - wb.level.min()
+
+    wi_hi2 = total_node_wt * (height_h**2)
+    sum_Wi_hi2 = wi_hi2.sum()
+
     if sum_Wi_hi2 == 0:
-        df['Seismic_Force'] = 0
+        force = np.zeros(len(wb))
     else:
-        df['Seismic_Force'] = Base_Shear * (df['Wi_hi2'] / sum_Wi_hi2)
-    
-    df['Seismic_Shear'] = df['Seismic_Force'].cumsum()
-    
-    moments = [0.0] * len(df)
-    for i in range(1, len(df)):
-        moments[i] = moments[i-1] + (df.at[i-1, 'Seismic_Shear'] * df.at[i-1, 'Segment_H'])
-    
-    df['Seismic_Moment'] = moments
-    return df, Base_Shear
+        force = Base_Shear * (wi_hi2 / sum_Wi_hi2)
+
+    shear = np.cumsum(force)
+
+    # Same prefix-sum identity as the wind moments - no Python loop
+    moments = np.zeros(len(wb))
+    moments[1:] = np.cumsum(shear[:-1] * wb.segment_h[:-1])
+
+    return {
+        'Total_Node_Wt': total_node_wt,
+        'Seismic_Force': force,
+        'Seismic_Shear': shear,
+        'Seismic_Moment': moments,
+    }, Base_Shear
 
 # ==============================================================================
 # 4. SHEET 4: STRESS ANALYSIS
 # ==============================================================================
-def calculate_sheet_4(df):
-    df['Axial_Load_P'] = df['Total_Node_Wt'].cumsum()
-    df['Design_Moment_M'] = df[['Wind_Moment', 'Seismic_Moment']].max(axis=1)
-    
-    results = []
-    for i, row in df.iterrows():
-        P = row['Axial_Load_P']
-        M = row['Design_Moment_M']
-        A = row['Area']
-        Z = row['Z_Modulus']
-        
-        sigma_direct = P / A if A > 0 else 0
-        sigma_bending = M / Z if Z > 0 else 0
-        
-        max_comp = sigma_direct + sigma_bending
-        min_stress = sigma_direct - sigma_bending 
-        
-        results.append({
-            'Level': row['Level'],
-            'Axial_P': P,
-            'Moment_M': M,
-            'Stress_Direct': sigma_direct,
-            'Stress_Bending': sigma_bending,
-            'Max_Comp (t/m2)': max_comp,
-            'Min_Stress (t/m2)': min_stress,
-            'Status': "⚠️ TENSION" if min_stress < 0 else "OK"
-        })
-        
-    return pd.DataFrame(results)
+@st.cache_data(max_entries=32, hash_funcs={Workbook: Workbook.tobytes})
+def calculate_sheet_4(wb, wind, seismic):
+    P = np.cumsum(seismic['Total_Node_Wt'])
+    M = np.maximum(wind['Wind_Moment'], seismic['Seismic_Moment'])
+    A = wb.area
+    Z = wb.z_mod
+
+    # Guard the divisors so degenerate rows (A or Z <= 0) give zero stress
+    sigma_direct = np.where(A > 0, P / np.where(A > 0, A, 1), 0.0)
+    sigma_bending = np.where(Z > 0, M / np.where(Z > 0, Z, 1), 0.0)
+
+    max_comp = sigma_direct + sigma_bending
+    min_stress = sigma_direct - sigma_bending
+
+    # 1-byte codes into a two-label dictionary instead of N Python strings
+    status = pd.Categorical.from_codes((min_stress < 0).astype(np.int8),
+                                       categories=["OK", "⚠️ TENSION"])
+
+    return pd.DataFrame({
+        'Level': wb.level,
+        'Axial_P': P,
+        'Moment_M': M,
+        'Stress_Direct': sigma_direct,
+        'Stress_Bending': sigma_bending,
+        'Max_Comp (t/m2)': max_comp,
+        'Min_Stress (t/m2)': min_stress,
+        'Status': status
+    }, copy=False)
+
+# ==============================================================================
+# 5. FULL PIPELINE (SHEETS 2-4 IN ONE CACHED PASS)
+# ==============================================================================
+@st.cache_data(max_entries=32, hash_funcs={Workbook: Workbook.tobytes})
+def run_full_pipeline(wb, vb, zone_factor):
+    # One pass over sheets 2-4 so a rerun with unchanged inputs costs a
+    # single cache lookup instead of three per-tab copies + recomputes
+    wind = calculate_sheet_2(wb, vb=vb)
+    seismic, base_shear = calculate_sheet_3(wb, zone_factor=zone_factor)
+    df_stress = calculate_sheet_4(wb, wind, seismic)
+
+    # DataFrame materialized only here, for display
+    df_loads = pd.DataFrame({'Level': wb.level, **wind, **seismic}, copy=False)
+    return df_loads, df_stress, base_shear
+
+@st.cache_data(max_entries=32)
+def to_csv_bytes(df):
+    # Serialized once per distinct result, not on every rerun
+    return df.to_csv(index=False).encode('utf-8')
 
 # ==============================================================================
 # MAIN APP INTERFACE
@@ -173,7 +267,12 @@ with st.sidebar:
     p['total_height'] = st.number_input("Total Height (m)", value=p['total_height'])
     p['top_inner_dia'] = st.number_input("Top Inner Dia (m)", value=p['top_inner_dia'])
     p['thickness'] = st.number_input("Shell Thickness (m)", value=p['thickness'])
-    
+    p['grade_conc'] = st.selectbox("Concrete Grade", list(MATERIAL_TABLE),
+                                   index=list(MATERIAL_TABLE).index(p['grade_conc']))
+    mat = material_constants(p['grade_conc'])
+    st.caption(f"σcbc = {mat.sigma_cbc:.1f} N/mm² | m = {mat.m_ratio:.2f} | "
+               f"E = {mat.E_static_tm2:,.0f} t/m²")
+
     st.markdown("---")
     st.header("Load Parameters")
     p['wind_speed'] = st.number_input("Basic Wind Speed (m/s)", value=p['wind_speed'])
@@ -186,7 +285,7 @@ with st.sidebar:
 if st.session_state.workbook_data is None:
     st.session_state.workbook_data = generate_sheet_1(st.session_state.params)
 
-df_main = st.session_state.workbook_data
+wb_main = st.session_state.workbook_data
 
 tab1, tab2, tab3, tab4 = st.tabs([
     "1. Dead Loads (Geometry)", 
@@ -198,10 +297,11 @@ tab1, tab2, tab3, tab4 = st.tabs([
 with tab1:
     st.subheader("I. DEAD LOADS & GEOMETRY")
     cols = ['Level', 'Outer_Dia', 'Inner_Dia', 'Thickness', 'Shell_Wt', 'Liner_Load', 'Platform_Load', 'Corbel_Load']
-    
+
+    grid_df = wb_main.to_frame()[cols]
     edited_df = st.data_editor(
-        df_main[cols], 
-        height=500, 
+        grid_df,
+        height=500,
         use_container_width=True,
         column_config={
             "Shell_Wt": st.column_config.NumberColumn(disabled=True, format="%.3f"),
@@ -210,41 +310,46 @@ with tab1:
             "Thickness": st.column_config.NumberColumn(format="%.3f")
         }
     )
-    df_main.update(edited_df)
-    st.session_state.workbook_data = df_main
+    # Push only the columns the user actually changed back into the workbook
+    # arrays; the common no-edit rerun skips the write-back entirely
+    if not edited_df.equals(grid_df):
+        for name in cols:
+            edited_col = edited_df[name].to_numpy(dtype=np.float64)
+            if not np.array_equal(edited_col, getattr(wb_main, Workbook.COLUMNS[name])):
+                setattr(wb_main, Workbook.COLUMNS[name], edited_col)
+
+# Sheets 2-4 are deterministic functions of the edited grid + load params;
+# compute them once per rerun and let every tab read the shared result
+df_loads, df_stress, base_shear = run_full_pipeline(wb_main, vb=p['wind_speed'], zone_factor=p['seismic_zone'])
 
 with tab2:
     st.subheader("II. WIND LOAD ANALYSIS")
-    df_wind = calculate_sheet_2(df_main.copy(), vb=p['wind_speed'])
-    st.session_state.workbook_data = df_wind 
-    st.dataframe(df_wind[['Level', 'Wind_Force_Ton', 'Wind_Shear', 'Wind_Moment']].style.format("{:.3f}"), use_container_width=True)
-    st.line_chart(df_wind.set_index('Level')[['Wind_Moment']])
+    st.dataframe(df_loads[['Level', 'Wind_Force_Ton', 'Wind_Shear', 'Wind_Moment']].style.format("{:.3f}"), use_container_width=True)
+    st.line_chart(df_loads.set_index('Level')[['Wind_Moment']])
 
 with tab3:
     st.subheader("III. SEISMIC LOAD ANALYSIS")
-    df_seismic, base_shear = calculate_sheet_3(st.session_state.workbook_data.copy(), zone_factor=p['seismic_zone'])
-    st.session_state.workbook_data = df_seismic 
     st.metric("Total Base Shear (Vb)", f"{base_shear:.2f} Ton")
-    st.dataframe(df_seismic[['Level', 'Total_Node_Wt', 'Seismic_Force', 'Seismic_Shear', 'Seismic_Moment']].style.format("{:.3f}"), use_container_width=True)
-    st.line_chart(df_seismic.set_index('Level')[['Seismic_Moment']])
+    st.dataframe(df_loads[['Level', 'Total_Node_Wt', 'Seismic_Force', 'Seismic_Shear', 'Seismic_Moment']].style.format("{:.3f}"), use_container_width=True)
+    st.line_chart(df_loads.set_index('Level')[['Seismic_Moment']])
 
 with tab4:
     st.subheader("IV. RESULTANT STRESSES")
-    df_stress = calculate_sheet_4(st.session_state.workbook_data.copy())
-    
-    def highlight_tension(val):
-        color = 'red' if val < 0 else 'green'
-        return f'color: {color}; font-weight: bold'
+
+    def highlight_tension(col):
+        # Whole-column styling in one vectorized call (no per-cell callable)
+        return np.where(col < 0, 'color: red; font-weight: bold',
+                        'color: green; font-weight: bold')
 
     # Define numeric columns to format separately from text columns
     numeric_cols = ['Axial_P', 'Moment_M', 'Stress_Direct', 'Stress_Bending', 'Max_Comp (t/m2)', 'Min_Stress (t/m2)']
-    
+
     st.dataframe(
         df_stress.style.format("{:.2f}", subset=numeric_cols)  # <--- FIXED: Only format numeric columns
-                       .applymap(highlight_tension, subset=['Min_Stress (t/m2)']),
+                       .apply(highlight_tension, subset=['Min_Stress (t/m2)']),
         use_container_width=True,
         height=600
     )
     
-    csv = df_stress.to_csv(index=False).encode('utf-8')
+    csv = to_csv_bytes(df_stress)
     st.download_button("Download Full Calculation Report", csv, "chimney_report.csv", "text/csv")